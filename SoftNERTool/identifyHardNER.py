@@ -4,6 +4,9 @@ Within the main function block ("if __name__ == "__main__":"), find and update:
 
 1. "jsonLabeledTokenizedPath" (list of strings): a list of JSON file paths referring to the soft NER JSON that the soft NER tagging tool provided.
 2. "hardNERJsonStorage" (string): file path of one JSON file where you will store the labeled hard NER.
+3. (optional) "labelHardNER.exportManyHardNERLabels": label a list of soft NER JSON files in one run and write one hard NER JSON per story into a folder.
+
+In the output JSON, every hard NER entity stores "sentence_index", the position of its sentence in the "sentences" list, rather than a copy of the whole sentence.
 
 
 If you do not have spaCy, run:
@@ -12,55 +15,236 @@ pip install spacy
 
 in your terminal.
 
+If you have a GPU, you can pass modelName="en_core_web_trf" and useGPU=True to labelHardNER to use spaCy's transformer model instead. The transformer model is sped up with spacy-accelerate (fp16 + TensorRT/ONNX Runtime) when it is installed:
+
+python -m spacy download en_core_web_trf
+pip install spacy-accelerate
+
+If spacy-accelerate or the GPU is not available, the program falls back to running the plain spaCy model.
+
+Optionally, run:
+
+pip install orjson
+
+to write the output JSON faster. Without orjson, the program uses Python's built-in json library.
+
 '''
 
-import json, spacy
+import json, os, hashlib, warnings, spacy
+from itertools import groupby
+from bisect import bisect_left
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Bump this when the structure returned by labelHardNER() changes so that old cache files are not reused
+_NER_CACHE_VERSION = 3
+
+# We only need hard NER that are related to space. Each accepted spaCy label maps to the label string we store, built once here instead of once per entity.
+_HARD_NER_LABELS = {label: "Hard " + label for label in ("FAC", "GPE", "LOC")}
+
+# Loaded spaCy pipelines, keyed by (model name, GPU or not), so that every labelHardNER object in the same run shares one loaded model instead of reading it from disk again
+_loadedNERLabelers = {}
+
+def _accelerateTransformer(NERLabeler):
+    """Wrap a transformer pipeline with spacy-accelerate (fp16 + TensorRT). Returns the original pipeline if that is not possible."""
+    try:
+        import spacy_accelerate
+    except ImportError:
+        warnings.warn("spacy-accelerate is not installed, running the transformer model without it")
+        return NERLabeler
+
+    try:
+        return spacy_accelerate.optimize(NERLabeler, precision="fp16", provider="tensorrt")
+    except Exception as e:
+        # spacy-accelerate is installed but could not optimize the model (for example a CUDA/TensorRT problem), so say what went wrong instead of hiding it
+        warnings.warn(f"spacy-accelerate could not optimize the transformer model, running it without acceleration: {type(e).__name__}: {e}")
+        return NERLabeler
+
+def _getNERLabeler(modelName, useGPU):
+    """Load a spaCy pipeline the first time it is asked for and reuse it afterwards."""
+    key = (modelName, useGPU)
+    if key not in _loadedNERLabelers:
+        if useGPU:
+            spacy.prefer_gpu()
+
+        # We only read the named entities, so the components that NER does not depend on are excluded and never loaded ("tok2vec"/"transformer" stay because the NER component needs them).
+        NERLabeler = spacy.load(modelName, exclude=["tagger", "parser", "lemmatizer", "attribute_ruler", "senter"])
+        if useGPU and modelName.endswith("_trf"):
+            NERLabeler = _accelerateTransformer(NERLabeler)
+
+        _loadedNERLabelers[key] = NERLabeler
+    return _loadedNERLabelers[key]
 
 class labelHardNER:
-    def __init__(self, sentenceTokenizedJson):
+    def __init__(self, sentenceTokenizedJson, modelName="en_core_web_sm", useGPU=False, batchSize=None, nProcess=1, cacheDir=".ner_cache"):
 
         #This file is the output json of the softNERTagging tool. The output JSON contains tokenized sentences plus labeled soft NER. This python class object only needs the tokenized sentences.
         self.sentenceTokenized = sentenceTokenizedJson
+        self.modelName = modelName
 
+        # Folder where finished NER results are stored so that running the same story again skips spaCy. Set to None to turn caching off.
+        self.cacheDir = cacheDir
+
+        self.NERLabeler = _getNERLabeler(modelName, useGPU)
+
+        # Transformer models run best with smaller batches on the GPU.
+        # nProcess stays 1 unless you ask for more: every extra worker process loads its own copy of the spaCy model, which costs more than it saves on a typical story. For a very large CPU run (many thousands of sentences), try nProcess=os.cpu_count(). Keep it at 1 with useGPU=True, since spaCy cannot share one GPU across several processes.
+        if batchSize is None:
+            batchSize = 32 if modelName.endswith("_trf") else 128
+        self.batchSize = batchSize
+        self.nProcess = nProcess
 
     def loadSentenceTokenized(self):
         with open(self.sentenceTokenized, "r") as storyFile:
             storyContent = json.load(storyFile)
         return storyContent["sentences"]
-    
+
+    def getCachePath(self):
+        """Return the cache file for this input JSON. The file name is a hash of the input's bytes, the model (name and version) and the spaCy version, so editing the story, switching models or upgrading either one creates a new cache entry."""
+        if self.cacheDir is None:
+            return None
+        with open(self.sentenceTokenized, "rb") as storyFile:
+            digest = hashlib.blake2b(storyFile.read(), digest_size=16)
+        modelMeta = getattr(self.NERLabeler, "meta", {})
+        digest.update(f"{self.modelName}:{modelMeta.get('lang')}_{modelMeta.get('name')}:{modelMeta.get('version')}:{spacy.__version__}:{_NER_CACHE_VERSION}".encode("utf-8"))
+        return os.path.join(self.cacheDir, digest.hexdigest() + ".json")
+
+    def readCache(self, cachePath):
+        """Return (hard NER storage, sentences) from the cache, or None if this story has not been labeled before or its cache file is unreadable."""
+        if cachePath is None or not os.path.exists(cachePath):
+            return None
+        try:
+            with open(cachePath, "r", encoding="utf-8") as cacheFile:
+                cached = json.load(cacheFile)
+            return cached["annotations"], cached["sentences"]
+        except (ValueError, KeyError, TypeError):
+            # A corrupt or half-written cache file (e.g. the run was stopped while writing it) is treated as a miss, so the story is labeled again and the file is overwritten
+            return None
+
+    def writeCache(self, cachePath, hardNERStorage, sentTokenizedStory):
+        if cachePath is None:
+            return
+        os.makedirs(self.cacheDir, exist_ok=True)
+        # Write to a temporary file first and then swap it in, so a stopped run never leaves a half-written cache file behind
+        temporaryPath = cachePath + ".tmp"
+        with open(temporaryPath, "w", encoding="utf-8") as cacheFile:
+            json.dump({"annotations": hardNERStorage, "sentences": sentTokenizedStory}, cacheFile, ensure_ascii=False)
+        os.replace(temporaryPath, cachePath)
+
+    def runNER(self, sentTokenizedStory):
+        """Run spaCy over a list of sentences and collect the hard NER labels."""
+        # Parallel lists that store the hard NER labels: position i in every list describes the same entity. "sentenceId" is the entity's index into sentTokenizedStory, so the sentence text itself is not copied per entity.
+        hardNERStorage = {"start": [], "end": [], "text": [], "label": [], "sentenceId": []}
+        starts, ends, texts, labels, sentenceIds = (hardNERStorage[key] for key in ("start", "end", "text", "label", "sentenceId"))
+
+        # nlp.pipe runs the sentences through spaCy in batches (and across several processes) instead of one call per sentence.
+        sentDocs = self.NERLabeler.pipe(
+            sentTokenizedStory,
+            batch_size=self.batchSize,
+            n_process=self.nProcess
+        )
+
+        for sentenceId, sent in enumerate(sentDocs):
+            for ent in sent.ents: # Each sentence might have multiple named entities
+                hardLabel = _HARD_NER_LABELS.get(ent.label_)
+                if hardLabel is not None:
+                    starts.append(ent.start_char)
+                    ends.append(ent.end_char)
+                    texts.append(ent.text)
+                    labels.append(hardLabel)
+                    sentenceIds.append(sentenceId)
+
+        return hardNERStorage
+
     def labelHardNER(self):
-        sentTokenizedStory = self.loadSentenceTokenized()
+        cachePath = self.getCachePath()
+        cached = self.readCache(cachePath)
+        if cached is not None:
+            return cached
 
-        storageDict = {} # dictionary that stores the hard NER labels
-        NERLabeler = spacy.load('en_core_web_sm')
-        
-        NERLabelCounter = 0
-
-        for sentence in sentTokenizedStory:
-            sent = NERLabeler(sentence)
-            entityInfo = [] # Each sentence might have multiple named entities
-            for ent in sent.ents:
-                if ent.label_ in ["FAC", "GPE", "LOC"]: # we only need hard NER that are related to space
-                    entityInfo.append({
-                        "start": ent.start_char,
-                        "end": ent.end_char,
-                        "text": ent.text,
-                        "label": "Hard " + ent.label_,
-                        "sentence": sentence
-                    })
-            if entityInfo != []:
-                storageDict[str(NERLabelCounter)] = entityInfo
-                NERLabelCounter += 1
+        sentTokenizedStory = self.loadSentenceTokenized()
+        hardNERStorage = self.runNER(sentTokenizedStory)
+        self.writeCache(cachePath, hardNERStorage, sentTokenizedStory)
         
-        return storageDict, sentTokenizedStory
+        return hardNERStorage, sentTokenizedStory
     
     def exportHardNERLabel(self, jsonPath):
-        returnDict = {}
-        HardNERStorageDict, allSentencesList = self.labelHardNER()
-        returnDict["sentences"] = allSentencesList
-        returnDict["annotations"] = HardNERStorageDict
-        with open(jsonPath, "w") as destination:
-            json.dump(returnDict, destination, indent=4)
+        HardNERStorage, allSentencesList = self.labelHardNER()
+        _writeHardNERJson(HardNERStorage, allSentencesList, jsonPath)
+
+    @classmethod
+    def exportManyHardNERLabels(cls, sentenceTokenizedJsonList, outputDir, **labelerOptions):
+        """Label several stories with one spaCy run and write one hard NER JSON per story into outputDir.
+
+        The sentences of every story that is not already cached are joined into one stream, labeled with a single nlp.pipe call, and split back per story afterwards. Each output file is named after its input file, e.g. "annotationsStation4.json" becomes "annotationsStation4HardNER.json". Returns the list of output paths.
+        """
+        labelers = [cls(path, **labelerOptions) for path in sentenceTokenizedJsonList]
+        results = [None] * len(labelers)
+        cachePaths = [labeler.getCachePath() for labeler in labelers]
+
+        pendingStories = [] # (story index, sentences) for stories that still need spaCy
+        for i, labeler in enumerate(labelers):
+            results[i] = labeler.readCache(cachePaths[i])
+            if results[i] is None:
+                pendingStories.append((i, labeler.loadSentenceTokenized()))
+
+        if pendingStories:
+            allSentences = [sentence for _, sentences in pendingStories for sentence in sentences]
+            combinedStorage = labelers[0].runNER(allSentences)
+            combinedSentenceIds = combinedStorage["sentenceId"]
+
+            # Entities come out in sentence order, so each story's entities are one contiguous slice of the combined lists
+            offset = 0
+            for i, sentences in pendingStories:
+                first = bisect_left(combinedSentenceIds, offset)
+                last = bisect_left(combinedSentenceIds, offset + len(sentences))
+                hardNERStorage = {key: values[first:last] for key, values in combinedStorage.items()}
+                hardNERStorage["sentenceId"] = [sentenceId - offset for sentenceId in hardNERStorage["sentenceId"]]
+
+                labelers[i].writeCache(cachePaths[i], hardNERStorage, sentences)
+                results[i] = (hardNERStorage, sentences)
+                offset += len(sentences)
+
+        os.makedirs(outputDir, exist_ok=True)
+        outputPaths = []
+        for path, (hardNERStorage, sentences) in zip(sentenceTokenizedJsonList, results):
+            storyName = os.path.splitext(os.path.basename(path))[0]
+            outputPath = os.path.join(outputDir, storyName + "HardNER.json")
+            _writeHardNERJson(hardNERStorage, sentences, outputPath)
+            outputPaths.append(outputPath)
+        return outputPaths
+
+
+def _writeHardNERJson(HardNERStorage, allSentencesList, jsonPath):
+    returnDict = {}
+    returnDict["sentences"] = allSentencesList
+
+    # The JSON keeps one list of entity dictionaries per sentence that has hard NER. The key is the sentence's position in "sentences" (sentences without hard NER have no key), which is how trainingDataBuilder.py finds the sentence. The dictionaries are only built here, at export time. Each entity also stores that position as "sentence_index" instead of repeating the sentence text.
+    starts, ends, texts, labels, sentenceIds = (HardNERStorage[key] for key in ("start", "end", "text", "label", "sentenceId"))
+    entitiesBySentence = groupby(range(len(starts)), key=sentenceIds.__getitem__)
+    returnDict["annotations"] = {
+        str(sentenceId): [
+            {
+                "start": starts[j],
+                "end": ends[j],
+                "text": texts[j],
+                "label": labels[j],
+                "sentence_index": sentenceId
+            }
+            for j in entityIndices
+        ]
+        for sentenceId, entityIndices in entitiesBySentence
+    }
+    if orjson is not None:
+        # orjson serializes the whole dictionary in C and hands it to the file in a single write
+        with open(jsonPath, "wb") as destination:
+            destination.write(orjson.dumps(returnDict, option=orjson.OPT_INDENT_2))
+    else:
+        with open(jsonPath, "w", encoding="utf-8") as destination:
+            json.dump(returnDict, destination, indent=2, ensure_ascii=False)
 
 
 if __name__ == "__main__":
@@ -72,4 +256,13 @@ if __name__ == "__main__":
     hardNERJsonStorage = "AHabitPoseHardNER.json"
     
     hardNERLabeler = labelHardNER(jsonLabeledTokenizedPath)
-    hardNERLabeler.exportHardNERLabel(hardNERJsonStorage)
\ No newline at end of file
+    hardNERLabeler.exportHardNERLabel(hardNERJsonStorage)
+
+    # TODO: If you have several stories, you can label all of them in one go instead. This loads spaCy once and runs all sentences through it together. Put the soft NER JSON paths in the list and a folder path for the outputs; each story gets its own "<input file name>HardNER.json" in that folder.
+    # labelHardNER.exportManyHardNERLabels(
+    #     [
+    #         "/Users/Jerry/Desktop/AsteXT/AsteXTCode/AsteXTCode2025-6/Data/annotationsStation4.json",
+    #         "/Users/Jerry/Desktop/AsteXT/AsteXTCode/AsteXTCode2025-6/Data/annotationsAHabitPose.json"
+    #     ],
+    #     "HardNEROutputs"
+    # )
\ No newline at end of file
@@ -1,20 +1,145 @@
 """
-This file contails the interface to manually tag soft NERs in a story. Please make sure that you have both NLTK and PyQt5 installed. You can do so through using "pip". You can only upload a TXT file to this program. Make sure that you have stored the story you want to tag as a plain TXT file.
+This file contails the interface to manually tag soft NERs in a story. Please make sure that you have PyQt5 installed. You can do so through using "pip". You can only upload a TXT file to this program. Make sure that you have stored the story you want to tag as a plain TXT file.
 
-If you do not have NLTK or PyQt5 installed already, you can run:
+If you do not have PyQt5 installed already, you can run:
 
-pip install nltk
 pip install PyQt5
 
 in your terminal.
 
+Optionally, run:
+
+pip install blingfire
+pip install pysbd
+pip install orjson
+
+blingfire or pysbd splits stories into sentences more accurately. blingfire is much faster; if both are installed, blingfire is used. Without either, NLTK's punkt splitter is used if NLTK and its punkt data are installed, and otherwise a simple rule: a sentence ends at ".", "!" or "?" followed by a space and a capital letter, digit, or quote, unless the word before it is a common abbreviation like "Mr." or an initial. testingDataBuilder.py picks its splitter in the same order, so install the same packages for both to get testing sentences that are split like the tagged ones. orjson saves and loads JSON files faster. Without orjson, the program uses Python's built-in json library.
+
 After you've tagged the soft NERs, the system will export a JSON file. Please make sure to keep your JSON files organized so that we can easily refer to them.
 """
 
-import sys, nltk, json, re
-from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QLabel, QPushButton, QTextEdit, QMessageBox, QProgressBar, QFrame, QScrollArea, QFileDialog, QDialog, QListWidget, QLineEdit, QDialogButtonBox, QInputDialog, QSplitter, QTreeWidget, QTreeWidgetItem, QTabWidget
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QFont, QTextCursor, QTextCharFormat, QColor
+import sys, json, re, bisect, zlib
+from array import array
+from collections import Counter, defaultdict
+from itertools import groupby
+from operator import itemgetter
+from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QLabel, QPushButton, QPlainTextEdit, QMessageBox, QProgressBar, QScrollArea, QFileDialog, QDialog, QListWidget, QDialogButtonBox, QInputDialog, QSplitter, QTreeWidget, QTreeWidgetItem, QTabWidget, QHeaderView
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QFont, QTextCharFormat, QColor, QSyntaxHighlighter
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Translation table that turns line breaks and tabs into spaces in a single C-level pass
+NEWLINES_TO_SPACES = str.maketrans("\n\r\t", "   ")
+# Fallback sentence boundary: whitespace after ".", "!" or "?" that is followed by a capital letter, digit, or quote
+SENTENCE_BOUNDARY_PATTERN = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'])")
+# Words that end with "." without ending the sentence, so the fallback does not split "Mr. Smith" the way NLTK's punkt would not
+COMMON_ABBREVIATIONS = frozenset({
+    "mr", "mrs", "ms", "dr", "prof", "st", "jr", "sr", "mt", "ft", "rev", "hon", "gen", "col", "capt", "lt", "sgt",
+    "gov", "sen", "rep", "pres", "vs", "e.g", "i.e", "u.s", "jan", "feb", "mar", "apr", "aug", "sept", "oct", "nov", "dec",
+})
+
+def split_sentences_by_rule(content):
+    """Fallback splitter used when no sentence splitting library is installed. Returns (sentence, start) pairs"""
+    sentences = []
+    start = 0
+    for match in SENTENCE_BOUNDARY_PATTERN.finditer(content):
+        # Last word before the boundary, without opening quotes/brackets
+        last_word = content[start:match.start()].rsplit(None, 1)[-1].lstrip("\"'([")
+        if last_word.endswith("."):
+            word = last_word[:-1]
+            # Known abbreviations and single initials ("J. R. R. Tolkien") don't end a sentence
+            if word.lower() in COMMON_ABBREVIATIONS or (len(word) == 1 and word.isupper()):
+                continue
+        sentences.append((content[start:match.start()], start))
+        start = match.end()
+    sentences.append((content[start:], start))
+    return sentences
+
+def locate_sentences(content, sentences):
+    """Pair the sentences of a splitter that only returns text with where they start in content.
+    
+    The sentences are in order, so each one is searched for from the end of the previous one. A sentence whose text the splitter changed can't be found, and gets None instead of a made-up offset.
+    """
+    located = []
+    position = 0
+    for sentence in sentences:
+        sentence = sentence.strip()
+        offset = content.find(sentence, position) if sentence else -1
+        if offset == -1:
+            located.append((sentence, None))
+        else:
+            located.append((sentence, offset))
+            position = offset + len(sentence)
+    return located
+
+# Function that splits a story into a list of (sentence, start) pairs, picked the first time a story is loaded
+_sentence_splitter = None
+
+def get_sentence_splitter():
+    """Return the sentence splitter, importing it on first use so that startup stays fast.
+    
+    The order is blingfire, pysbd, NLTK's punkt, then split_sentences_by_rule. testingDataBuilder.loadSentenceSplitter uses the same order, so with the same packages installed the tagged sentences and the testing sentences are split the same way. Keep the two in sync.
+    """
+    global _sentence_splitter
+    if _sentence_splitter is None:
+        try:
+            from blingfire import text_to_sentences_and_offsets
+            
+            def blingfire_splitter(content):
+                # blingfire gives the (start, end) character span of every sentence, so the sentences are cut straight from the story
+                _, spans = text_to_sentences_and_offsets(content)
+                return [(content[start:end], start) for start, end in spans]
+            
+            _sentence_splitter = blingfire_splitter
+        except ImportError:
+            try:
+                import pysbd
+                segmenter = pysbd.Segmenter(language="en", clean=False)
+                
+                def pysbd_splitter(content):
+                    # pysbd only returns the sentence text, so the offsets have to be searched for
+                    return locate_sentences(content, segmenter.segment(content))
+                
+                _sentence_splitter = pysbd_splitter
+            except ImportError:
+                try:
+                    import nltk
+                    try:
+                        # NLTK 3.8.2 and newer
+                        punkt = nltk.tokenize.PunktTokenizer("english")
+                    except AttributeError:
+                        punkt = nltk.data.load("tokenizers/punkt/english.pickle")
+                    
+                    def punkt_splitter(content):
+                        return [(content[start:end], start) for start, end in punkt.span_tokenize(content)]
+                    
+                    _sentence_splitter = punkt_splitter
+                except (ImportError, LookupError):
+                    # NLTK or its punkt data is not installed
+                    _sentence_splitter = split_sentences_by_rule
+    return _sentence_splitter
+
+def segment_sentences(content):
+    """Split a story into sentences. Returns (sentences, offsets), where offsets[i] is where sentences[i] starts in content, or None if the splitter changed the sentence's text so it can't be found"""
+    kept_sentences = []
+    offsets = []
+    for sentence, offset in get_sentence_splitter()(content):
+        stripped = sentence.strip()
+        if not stripped:
+            continue
+        if offset is not None:
+            # Move the offset past any spaces that were stripped from the front
+            offset += len(sentence) - len(sentence.lstrip())
+        kept_sentences.append(stripped)
+        offsets.append(offset)
+    return kept_sentences, offsets
+
+# A word is a run of letters/digits (characters where str.isalnum() is true) plus apostrophes and hyphens
+WORD_PATTERN = re.compile(r"(?:[^\W_]|['-])+")
 
 class LabelSelectionDialog(QDialog):
     def __init__(self, labels, selected_text, parent=None):
@@ -122,32 +247,58 @@ class EntityLabelManager(QDialog):
                 self.labels.remove(label)
                 self.update_label_list()
 
-class ClickableTextEdit(QTextEdit):
+class EntityHighlighter(QSyntaxHighlighter):
+    """Colors the entities of a ClickableTextEdit. Qt only calls highlightBlock for blocks that need to be redrawn"""
+    def __init__(self, text_edit):
+        super().__init__(text_edit.document())
+        self.text_edit = text_edit
+    
+    def highlightBlock(self, text):
+        # Positions in selected_ranges are relative to the whole sentence, setFormat positions are relative to this block
+        block_start = self.currentBlock().position()
+        block_end = block_start + len(text)
+        
+        for start, end, label_id in self.text_edit.selected_ranges:
+            if end <= block_start:
+                continue
+            if start >= block_end:
+                break  # selected_ranges is sorted, so nothing later is in this block either
+            start = max(start, block_start)
+            end = min(end, block_end)
+            self.setFormat(start - block_start, end - start, self.text_edit._format_for(label_id))
+
+class ClickableTextEdit(QPlainTextEdit):
     def __init__(self, sentence, sentence_index, parent=None):
         super().__init__(parent)
         self.sentence = sentence
         self.sentence_index = sentence_index
         self.parent_window = parent
-        self.selected_ranges = []  # Store (start, end, label) tuples
+        self.selected_ranges = []  # Store (start, end, label_id) tuples, kept sorted by start. label_id indexes parent_window.label_names
+        self._exact_ranges = {}  # (start, end) -> label_id, for exact-match lookups
         self.selection_start = None
         self.double_click_started = False
         
+        # Word spans are found once per sentence so that double-clicks only need a binary search
+        self._word_spans = [match.span() for match in WORD_PATTERN.finditer(sentence)]
+        self._word_starts = [start for start, _ in self._word_spans]
+        
         # Setup text display
         self.setPlainText(sentence)
+        self._highlighter = EntityHighlighter(self)
         self.setReadOnly(True)
         self.setMaximumHeight(100)
         self.setMinimumHeight(60)
         
         # Style the text area
         self.setStyleSheet("""
-            QTextEdit {
+            QPlainTextEdit {
                 border: 2px solid #ddd;
                 border-radius: 5px;
                 padding: 10px;
                 font-size: 14px;
                 background-color: #fafafa;
             }
-            QTextEdit:hover {
+            QPlainTextEdit:hover {
                 border-color: #4CAF50;
             }
         """)
@@ -170,7 +321,7 @@ class ClickableTextEdit(QTextEdit):
                     # Remove the existing entity
                     self.remove_selection(existing_entity[0], existing_entity[1], existing_entity[2])
                     if self.parent_window:
-                        self.parent_window.status_label.setText(f"Removed entity: '{selected_text}' ({existing_entity[2]})")
+                        self.parent_window.set_status(f"Removed entity: '{selected_text}' ({self.parent_window.label_names[existing_entity[2]]})")
                 elif not self.overlaps_existing_selection(start, end):
                     # ask user to select a label
                     if self.parent_window and self.parent_window.entity_labels:
@@ -179,7 +330,7 @@ class ClickableTextEdit(QTextEdit):
                             # Add new entity with label
                             self.add_selection(start, end, selected_text, dialog.selected_label)
                             if self.parent_window:
-                                self.parent_window.status_label.setText(f"Added entity: '{selected_text}' ({dialog.selected_label})")
+                                self.parent_window.set_status(f"Added entity: '{selected_text}' ({dialog.selected_label})")
                     else:
                         QMessageBox.warning(self, "No Labels", "Please set up entity labels first using the 'Manage Labels' button.")
                 else:
@@ -190,53 +341,21 @@ class ClickableTextEdit(QTextEdit):
     
     def find_word_boundaries(self, position):
         """Find the start and end positions of the word at the given position"""
-        text = self.sentence
-        
         # If position is out of bounds, return invalid range
-        if position < 0 or position >= len(text):
+        if position < 0 or position >= len(self.sentence):
             return position, position
         
-        # Find start of word (move backward)
-        start = position
-        while start > 0 and self.is_word_char(text[start - 1]):
-            start -= 1
-        
-        # Find end of word (move forward)
-        end = position
-        while end < len(text) and self.is_word_char(text[end]):
-            end += 1
-        
-        # If we're on a non-word character, try to find the nearest word
-        if start == end:
-            # Look backward for a word
-            temp_pos = position - 1
-            while temp_pos >= 0 and not self.is_word_char(text[temp_pos]):
-                temp_pos -= 1
-            
-            if temp_pos >= 0:
-                # Found a word character, find its boundaries
-                end = temp_pos + 1
-                start = temp_pos
-                while start > 0 and self.is_word_char(text[start - 1]):
-                    start -= 1
-            else:
-                # Look forward for a word
-                temp_pos = position
-                while temp_pos < len(text) and not self.is_word_char(text[temp_pos]):
-                    temp_pos += 1
-                
-                if temp_pos < len(text):
-                    start = temp_pos
-                    end = temp_pos + 1
-                    while end < len(text) and self.is_word_char(text[end]):
-                        end += 1
+        # Index of the last word that starts at or before the position
+        i = bisect.bisect_right(self._word_starts, position) - 1
         
-        return start, end
+        if i >= 0:
+            # Either the position is inside (or right after) this word, or we're on a non-word character and this is the nearest word before it
+            return self._word_spans[i]
+        if self._word_spans:
+            # No word before the position, use the first word after it
+            return self._word_spans[0]
+        return position, position
     
-    def is_word_char(self, char):
-        """Check if character is part of a word (alphanumeric or common word characters)"""
-        return char.isalnum() or char in "'-"
-        
     def mousePressEvent(self, event):
         if event.button() == Qt.LeftButton:
             cursor = self.cursorForPosition(event.pos())
@@ -257,8 +376,8 @@ class ClickableTextEdit(QTextEdit):
                     selected_text = self.sentence[start:end]
                     self.process_selection(start, end, selected_text)
                 
-                # Clear temporary highlighting
-                self.highlight_selections()
+                # Clear temporary highlighting (process_selection already redrew any entity that changed)
+                self.clear_text_selection()
                 
             elif self.selection_start is not None:
                 # Handle regular click-and-drag selection
@@ -288,7 +407,7 @@ class ClickableTextEdit(QTextEdit):
             # Remove the existing entity
             self.remove_selection(existing_entity[0], existing_entity[1], existing_entity[2])
             if self.parent_window:
-                self.parent_window.status_label.setText(f"Removed entity: '{selected_text}' ({existing_entity[2]})")
+                self.parent_window.set_status(f"Removed entity: '{selected_text}' ({self.parent_window.label_names[existing_entity[2]]})")
         elif not self.overlaps_existing_selection(start, end):
             # Ask user to select a label
             if self.parent_window and self.parent_window.entity_labels:
@@ -297,7 +416,7 @@ class ClickableTextEdit(QTextEdit):
                     # Add new entity with label
                     self.add_selection(start, end, selected_text, dialog.selected_label)
                     if self.parent_window:
-                        self.parent_window.status_label.setText(f"Added entity: '{selected_text}' ({dialog.selected_label})")
+                        self.parent_window.set_status(f"Added entity: '{selected_text}' ({dialog.selected_label})")
             else:
                 QMessageBox.warning(self, "No Labels", "Please set up entity labels first using the 'Manage Labels' button.")
         else:
@@ -306,354 +425,126 @@ class ClickableTextEdit(QTextEdit):
     
     def overlaps_existing_selection(self, start, end):
         """Check if the new selection overlaps with any existing selection"""
-        for existing_start, existing_end, existing_label in self.selected_ranges:
-            if not (end <= existing_start or start >= existing_end):
-                return True
-        return False
+        # Entities never overlap each other, so in start order their ends are sorted too. Only the last entity that starts before the new selection ends can overlap it.
+        i = bisect.bisect_left(self.selected_ranges, (end,))
+        return i > 0 and self.selected_ranges[i - 1][1] > start
     
     def find_exact_entity_match(self, start, end):
-        """Check if the selection exactly matches an existing entity"""
-        for existing_start, existing_end, existing_label in self.selected_ranges:
-            if start == existing_start and end == existing_end:
-                return (existing_start, existing_end, existing_label)
-        return None
+        """Check if the selection exactly matches an existing entity, returning (start, end, label_id)"""
+        label_id = self._exact_ranges.get((start, end))
+        if label_id is None:
+            return None
+        return (start, end, label_id)
     
     def add_selection(self, start, end, text, label):
         """Add a new entity selection with label"""
-        self.selected_ranges.append((start, end, label))
-        self.highlight_selections()
+        label_id = self.parent_window.get_label_id(label)
+        bisect.insort(self.selected_ranges, (start, end, label_id))
+        self._exact_ranges[(start, end)] = label_id
+        self.highlight_selections(start, end)
         
         # Update parent window
-        if self.parent_window:
-            self.parent_window.update_entity_display()
+        self.parent_window.on_entity_added(self.sentence_index, start, end, label_id)
     
-    def remove_selection(self, start, end, label):
+    def remove_selection(self, start, end, label_id):
         """Remove an entity selection"""
-        if (start, end, label) in self.selected_ranges:
-            self.selected_ranges.remove((start, end, label))
-            self.highlight_selections()
+        if self._exact_ranges.get((start, end)) == label_id:
+            del self._exact_ranges[(start, end)]
+            self.selected_ranges.pop(bisect.bisect_left(self.selected_ranges, (start, end, label_id)))
+            self.highlight_selections(start, end)
             
-            if self.parent_window:
-                self.parent_window.update_entity_display()
+            self.parent_window.on_entity_removed(self.sentence_index, start, end)
     
-    def highlight_selections(self):
-        """Highlight all selected entities in the text with different colors per label"""
-        cursor = self.textCursor()
-        cursor.select(QTextCursor.Document)
-        
-        # Clear existing formatting
-        format_clear = QTextCharFormat()
-        cursor.setCharFormat(format_clear)
-        
-        # Color mapping for different labels
-        label_colors = {
-            'PERSON': ("#FFE4B5", "#8B4513"),
-            'PLACE': ("#E0FFE0", "#2E8B57"),
-            'ORGANIZATION': ("#E0E6FF", "#4169E1"),
-            'TIME': ("#FFF0E6", "#FF6347"),
-            'EVENT': ("#F0E6FF", "#9370DB"),
-        }
-        
-        # Apply highlighting to each selection
-        for start, end, label in self.selected_ranges:
-            cursor.setPosition(start)
-            cursor.setPosition(end, QTextCursor.KeepAnchor)
-            
-            format_highlight = QTextCharFormat()
-            
-            # Use specific colors for known labels, default for others
-            if label in label_colors:
-                bg_color, fg_color = label_colors[label]
-            else:
-                # Generate a hash-based color for unknown labels
-                hash_val = hash(label) % 5
-                colors = [("#FFE4B5", "#8B4513"), ("#E0FFE0", "#2E8B57"), 
-                         ("#E0E6FF", "#4169E1"), ("#FFF0E6", "#FF6347"), ("#F0E6FF", "#9370DB")]
-                bg_color, fg_color = colors[hash_val]
-            
-            format_highlight.setBackground(QColor(bg_color))
-            format_highlight.setForeground(QColor(fg_color))
-            cursor.setCharFormat(format_highlight)
-        
-        # Reset cursor position
-        cursor.clearSelection()
-        self.setTextCursor(cursor)
-
-class NamedEntityAnnotationTool(QMainWindow):
-    def __init__(self):
-        super().__init__()
-        self.sentences = []
-        self.currentSentenceIndex = 0
-        self.annotations = {}  # Will store {sentence_index: [(start, end, text, label), ...]}
-        self.textWidgets = []
-        self.entity_labels = ["Private", "Communal/Public", "Extraterrestrial/Figurative", "Natural", "Institutional"]  # Default labels
-        
-        self.init_ui()
-        
-    def init_ui(self):
-        self.setWindowTitle("Named Entity Annotation Tool")
-        self.setGeometry(100, 100, 1000, 700)
-        
-        # Main widget and layout
-        main_widget = QWidget()
-        self.setCentralWidget(main_widget)
-        layout = QVBoxLayout(main_widget)
-        
-        # Header
-        header = QLabel("Named Entity Annotation Tool")
-        header.setFont(QFont("Arial", 18, QFont.Bold))
-        header.setAlignment(Qt.AlignCenter)
-        header.setStyleSheet("padding: 20px; color: #2E7D32;")
-        layout.addWidget(header)
-        
-        # Instructions
-        instructions = QLabel(
-            "Instructions: Click and drag to select named entities in the text below. "
-            "You'll be prompted to select a label type for each entity. Different labels are highlighted in different colors. "
-            "To remove an entity, click and drag over it again exactly. Click 'Save Annotations' when finished."
-        )
-        instructions.setWordWrap(True)
-        instructions.setStyleSheet("padding: 10px; background-color: #E8F5E8; border-radius: 5px; margin: 10px;")
-        layout.addWidget(instructions)
-        
-        # Control buttons
-        control_layout = QHBoxLayout()
-        
-        load_btn = QPushButton("Load Text File")
-        load_btn.clicked.connect(self.load_sentences)
-        load_btn.setStyleSheet(self.get_button_style("#4CAF50"))
-        control_layout.addWidget(load_btn)
-        
-        labels_btn = QPushButton("Manage Labels")
-        labels_btn.clicked.connect(self.manage_labels)
-        labels_btn.setStyleSheet(self.get_button_style("#FF9800"))
-        control_layout.addWidget(labels_btn)
-        
-        save_btn = QPushButton("Save Annotations")
-        save_btn.clicked.connect(self.save_annotations)
-        save_btn.setStyleSheet(self.get_button_style("#2196F3"))
-        control_layout.addWidget(save_btn)
-        
-        clear_btn = QPushButton("Clear All Annotations")
-        clear_btn.clicked.connect(self.clear_all_annotations)
-        clear_btn.setStyleSheet(self.get_button_style("#FF5722"))
-        control_layout.addWidget(clear_btn)
-        
-        layout.addLayout(control_layout)
-        
-        # Progress bar
-        self.progress_bar = QProgressBar()
-        self.progress_bar.setVisible(False)
-        layout.addWidget(self.progress_bar)
-        
-        # Current labels display
-        self.labels_display = QLabel(f"Current Labels: {', '.join(self.entity_labels)}")
-        self.labels_display.setStyleSheet("padding: 5px; background-color: #FFF3E0; border-radius: 3px; font-size: 11px;")
-        layout.addWidget(self.labels_display)
-        
-        # Scrollable area for sentences
-        scroll_area = QScrollArea()
-        scroll_widget = QWidget()
-        self.scroll_layout = QVBoxLayout(scroll_widget)
-        scroll_area.setWidget(scroll_widget)
-        scroll_area.setWidgetResizable(True)
-        layout.addWidget(scroll_area)
-        
-        # Current annotations display
-        self.annotations_label = QLabel("Current Annotations: None")
-        self.annotations_label.setStyleSheet("padding: 10px; background-color: #F5F5F5; border-radius: 5px;")
-        layout.addWidget(self.annotations_label)
-        
-        # Status bar
-        self.status_label = QLabel("Load a text file to begin annotation")
-        self.status_label.setStyleSheet("padding: 10px; color: #666;")
-        layout.addWidget(self.status_label)
-    
-    def get_button_style(self, color):
-        return f"""
-            QPushButton {{
-                background-color: {color};
-                color: white;
-                border: none;
-                padding: 10px 20px;
-                border-radius: 5px;
-                font-weight: bold;
-                font-size: 12px;
-            }}
-            QPushButton:hover {{
-                background-color: {color}DD;
-            }}
-            QPushButton:pressed {{
-                background-color: {color}BB;
-            }}
-        """
+    def clear_selections(self):
+        """Remove every entity selection in this sentence"""
+        self.selected_ranges = []
+        self._exact_ranges = {}
+        self.highlight_selections()
     
-    def manage_labels(self):
-        """Open dialog to manage entity labels"""
-        dialog = EntityLabelManager(self.entity_labels, self)
-        if dialog.exec_() == QDialog.Accepted:
-            self.entity_labels = dialog.labels
-            self.labels_display.setText(f"Current Labels: {', '.join(self.entity_labels)}")
+    # (background, text) color mapping for different labels
+    KNOWN_LABEL_COLORS = {
+        'PERSON': ("#FFE4B5", "#8B4513"),
+        'PLACE': ("#E0FFE0", "#2E8B57"),
+        'ORGANIZATION': ("#E0E6FF", "#4169E1"),
+        'TIME': ("#FFF0E6", "#FF6347"),
+        'EVENT': ("#F0E6FF", "#9370DB"),
+    }
+    # Colors for every other label, picked by a hash of the label
+    FALLBACK_LABEL_COLORS = (("#FFE4B5", "#8B4513"), ("#E0FFE0", "#2E8B57"),
+                             ("#E0E6FF", "#4169E1"), ("#FFF0E6", "#FF6347"), ("#F0E6FF", "#9370DB"))
     
-    def load_sentences(self):
-        """Load sentences from a file"""
-        file_path, _ = QFileDialog.getOpenFileName(
-            self, "Load Text File", "", "Text Files (*.txt);;JSON Files (*.json);;All Files (*)"
-        )
+    @classmethod
+    def make_label_format(cls, label):
+        """Build the highlight format for a label. This runs once per label, when the label gets its id"""
+        # Use specific colors for known labels, default for others
+        if label in cls.KNOWN_LABEL_COLORS:
+            bg_color, fg_color = cls.KNOWN_LABEL_COLORS[label]
+        else:
+            # crc32 instead of hash(), which changes between runs, so a label keeps its color every time the tool is opened
+            bg_color, fg_color = cls.FALLBACK_LABEL_COLORS[zlib.crc32(label.encode('utf-8')) % len(cls.FALLBACK_LABEL_COLORS)]
         
-        if not file_path:
-            return
-            
-        try:
-            if file_path.endswith('.json'):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    if isinstance(data, list):
-                        self.sentences = data
-                    else:
-                        QMessageBox.warning(self, "Invalid Format", "JSON file must contain a list of sentences.")
-                        return
-            else:
-                # This part cleans the stories into sentence segments
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    
-                    # Clean new lines
-                    content = re.sub(r"\n", " ", content)
-                    # Sentence segmentation
-                    segmentedSentences = nltk.sent_tokenize(content)
-
-                    self.sentences = segmentedSentences
-                                
-            self.setupAnnotationInterface()
-            self.status_label.setText(f"Loaded {len(self.sentences)} sentences")
-            
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to load file: {str(e)}")
+        format_highlight = QTextCharFormat()
+        format_highlight.setBackground(QColor(bg_color))
+        format_highlight.setForeground(QColor(fg_color))
+        return format_highlight
     
-    def setupAnnotationInterface(self):
-        """Setup the interface with loaded sentences"""
-        # Clear existing widgets
-        for i in reversed(range(self.scroll_layout.count())): 
-            self.scroll_layout.itemAt(i).widget().setParent(None)
-        
-        self.textWidgets = []
-        self.annotations = {}
-        
-        # Create text widgets for each sentence
-        for i, sentence in enumerate(self.sentences):
-            # Sentence header
-            header = QLabel(f"Sentence {i + 1}:")
-            header.setFont(QFont("Arial", 12, QFont.Bold))
-            header.setStyleSheet("margin-top: 15px; margin-bottom: 5px; color: #333;")
-            self.scroll_layout.addWidget(header)
-            
-            # Clickable text widget
-            text_widget = ClickableTextEdit(sentence, i, self)
-            self.textWidgets.append(text_widget)
-            self.scroll_layout.addWidget(text_widget)
-            
-            # Initialize annotations for this sentence
-            self.annotations[i] = []
-        
-        # Setup progress bar
-        self.progress_bar.setMaximum(len(self.sentences))
-        self.progress_bar.setValue(0)
-        self.progress_bar.setVisible(True)
-        
-        self.update_entity_display()
+    def _format_for(self, label_id):
+        """Return the (shared) highlight format for a label id"""
+        return self.parent_window.label_formats[label_id]
     
-    def update_entity_display(self):
-        """Update the display of current annotations"""
-        total_entities = 0
-        sentences_with_entities = 0
+    def highlight_selections(self, start=None, end=None):
+        """Highlight selected entities in the text with different colors per label.
         
-        for i, text_widget in enumerate(self.textWidgets):
-            entities = []
-            for start, end, label in text_widget.selected_ranges:
-                entity_text = text_widget.sentence[start:end]
-                entities.append((start, end, entity_text, label))
-            
-            self.annotations[i] = entities
-            if entities:
-                sentences_with_entities += 1
-                total_entities += len(entities)
-        
-        # Update progress
-        self.progress_bar.setValue(sentences_with_entities)
-        
-        # Update annotations display
-        if total_entities == 0:
-            self.annotations_label.setText("Current Annotations: None")
+        With start and end, only the text blocks covering [start, end) are redrawn (one entity added or removed). Without them the whole sentence is redrawn (e.g. after Clear All).
+        """
+        # The colors themselves come from EntityHighlighter, which reads selected_ranges whenever Qt asks it to
+        if start is None:
+            self._highlighter.rehighlight()
         else:
-            self.annotations_label.setText(
-                f"Current Annotations: {total_entities} entities in {sentences_with_entities} sentences"
-            )
-    
-    def save_annotations(self):
-        """Save annotations to JSON file"""
-        if not self.annotations:
-            QMessageBox.warning(self, "No Annotations", "No annotations to save.")
-            return
-        
-        file_path, _ = QFileDialog.getSaveFileName(
-            self, "Save Annotations", "annotations.json", "JSON Files (*.json)"
-        )
-        
-        if not file_path:
-            return
-        
-        try:
-            # Prepare data for export
-            export_data = {
-                "sentences": self.sentences,
-                "labels": self.entity_labels,
-                "annotations": {}
-            }
-            
-            for sentence_idx, entities in self.annotations.items():
-                if entities:  # Only include sentences with annotations
-                    export_data["annotations"][str(sentence_idx)] = [
-                        {
-                            "start": start,
-                            "end": end,
-                            "text": text,
-                            "label": label,
-                            "sentence": self.sentences[sentence_idx]
-                        }
-                        for start, end, text, label in entities
-                    ]
-            
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(export_data, f, indent=2, ensure_ascii=False)
-            
-            QMessageBox.information(self, "Success", f"Annotations saved to {file_path}")
-            
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to save annotations: {str(e)}")
+            block = self.document().findBlock(start)
+            while block.isValid():
+                self._highlighter.rehighlightBlock(block)
+                block = block.next()
+                if block.position() >= end:
+                    break
+        
+        self.clear_text_selection()
     
-    def clear_all_annotations(self):
-        """Clear all annotations"""
-        reply = QMessageBox.question(
-            self, "Clear Annotations", 
-            "Are you sure you want to clear all annotations?",
-            QMessageBox.Yes | QMessageBox.No
-        )
-        
-        if reply == QMessageBox.Yes:
-            for text_widget in self.textWidgets:
-                text_widget.selected_ranges = []
-                text_widget.highlight_selections()
-            
-            self.update_entity_display()
-            self.status_label.setText("All annotations cleared")
+    def clear_text_selection(self):
+        """Drop the mouse selection so only the entity colors are visible"""
+        # Reset cursor position
+        cursor = self.textCursor()
+        cursor.clearSelection()
+        self.setTextCursor(cursor)
 
 class EntitySummaryWidget(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.parent_window = parent
+        # Font of the label/sentence group rows, made once instead of once per row
+        self._group_font = QFont("Arial", 10, QFont.Bold)
+        self.reset_tree_index()
         self.init_ui()
     
+    def reset_tree_index(self):
+        """Forget where every entity sits in the trees (the trees themselves are cleared separately)"""
+        # Top-level items: label -> item in the By Label tree, sentence number -> item in the By Sentence tree
+        self._label_items = {}
+        self._sentence_items = {}
+        # Sorted keys that mirror the order of the items in each tree, so finding where to insert or remove an item is a bisect instead of a scan over the tree
+        self._label_order = []
+        self._sentence_order = []
+        self._label_keys = {}  # label -> [(sentence_num, start), ...]
+        self._sentence_keys = {}  # sentence_num -> [start, ...]
+        self._all_keys = []  # [(sentence_num, start), ...]
+        # (sentence_idx, start) -> (label, lowercased entity text) for every entity in the trees
+        self._tree_entities = {}
+        # How many entities share each lowercased text, for the "Unique Entities" count
+        self._text_counts = Counter()
+        # Rows of label/sentence groups that have not been expanded yet: label (or sentence number) -> [column texts, ...]. The child items are only built when the group is first expanded
+        self._pending_label_rows = {}
+        self._pending_sentence_rows = {}
+    
     def init_ui(self):
         layout = QVBoxLayout(self)
         
@@ -670,12 +561,14 @@ class EntitySummaryWidget(QWidget):
         self.by_label_tree = QTreeWidget()
         self.by_label_tree.setHeaderLabels(["Label", "Entity", "Sentence #", "Context"])
         self.by_label_tree.setAlternatingRowColors(True)
+        self.by_label_tree.itemExpanded.connect(lambda item: self.populate_group(item, self._pending_label_rows))
         self.tab_widget.addTab(self.by_label_tree, "By Label")
         
         # By Sentence tab
         self.by_sentence_tree = QTreeWidget()
         self.by_sentence_tree.setHeaderLabels(["Sentence", "Entity", "Label", "Position"])
         self.by_sentence_tree.setAlternatingRowColors(True)
+        self.by_sentence_tree.itemExpanded.connect(lambda item: self.populate_group(item, self._pending_sentence_rows))
         self.tab_widget.addTab(self.by_sentence_tree, "By Sentence")
         
         # All Entities tab (flat list)
@@ -710,102 +603,242 @@ class EntitySummaryWidget(QWidget):
         layout.addWidget(export_btn)
     
     def update_entity_display(self, annotations, sentences):
-        """Update all entity displays with current annotations"""
+        """Rebuild all entity displays from scratch (used after loading or clearing; single edits go through add_entity/remove_entity)"""
+        # No repaints or signals while the trees are rebuilt
+        self.set_trees_updates_enabled(False)
+        for tree in [self.by_label_tree, self.by_sentence_tree, self.all_entities_tree]:
+            tree.blockSignals(True)
+        
         # Clear all trees
         self.by_label_tree.clear()
         self.by_sentence_tree.clear()
         self.all_entities_tree.clear()
-        
-        # Collect all entities
-        all_entities = []
-        label_groups = {}
-        sentence_groups = {}
-        
-        for sentence_idx, entities in annotations.items():
+        self.reset_tree_index()
+        
+        # annotations come in (sentence, start) order and each item is one whole sentence, so a single pass can fill the By Sentence and All Entities trees directly, and every label group ends up sorted the way the By Label tree shows it
+        # Items are built detached from the trees and added with one addTopLevelItems per tree, instead of being inserted into the tree one at a time. Group rows are only kept as column texts until their group is expanded
+        label_groups = defaultdict(list)
+        sentence_items = []
+        all_entity_items = []
+        # Local names for what the inner loop calls for every entity, to skip the attribute lookups
+        get_context = self.get_context
+        add_entity_item = all_entity_items.append
+        all_keys = self._all_keys
+        tree_entities = self._tree_entities
+        text_counts = self._text_counts
+        
+        for sentence_idx, entities in annotations:
             if entities:
                 sentence_num = sentence_idx + 1
-                sentence_text = sentences[sentence_idx] if sentence_idx < len(sentences) else "Unknown"
+                # Annotations only exist for loaded sentences, so the index is always valid
+                sentence_text = sentences[sentence_idx]
+                
+                # By Sentence tree: one row per sentence
+                sentence_item = self.make_group_item(f"Sentence {sentence_num} ({len(entities)} entities)", sentence_num)
+                self._sentence_items[sentence_num] = sentence_item
+                self._sentence_order.append(sentence_num)
+                sentence_keys = self._sentence_keys[sentence_num] = []
+                sentence_rows = self._pending_sentence_rows[sentence_num] = []
                 
                 for start, end, entity_text, label in entities:
-                    entity_info = {
-                        'text': entity_text,
-                        'label': label,
-                        'sentence_idx': sentence_idx,
-                        'sentence_num': sentence_num,
-                        'start': start,
-                        'end': end,
-                        'context': self.get_context(sentence_text, start, end)
-                    }
+                    context = get_context(sentence_text, start, end)
+                    text_key = entity_text.lower()  # lowercased once here, used for the "Unique Entities" count
                     
-                    all_entities.append(entity_info)
+                    sentence_rows.append(["", entity_text, label, f"{start}-{end}"])
+                    sentence_keys.append(start)
                     
-                    # Group by label
-                    if label not in label_groups:
-                        label_groups[label] = []
-                    label_groups[label].append(entity_info)
+                    # All Entities tree
+                    add_entity_item(QTreeWidgetItem([entity_text, label, str(sentence_num), context]))
+                    all_keys.append((sentence_num, start))
+                    tree_entities[(sentence_idx, start)] = (label, text_key)
+                    text_counts[text_key] += 1
                     
-                    # Group by sentence
-                    if sentence_num not in sentence_groups:
-                        sentence_groups[sentence_num] = []
-                    sentence_groups[sentence_num].append(entity_info)
+                    # By Label rows are built below, once all groups are known
+                    label_groups[label].append((entity_text, sentence_num, start, context))
+                
+                sentence_items.append(sentence_item)
+        
+        # Groups start collapsed; their rows are built by populate_group when the user expands them
+        self.by_sentence_tree.addTopLevelItems(sentence_items)
+        self.all_entities_tree.addTopLevelItems(all_entity_items)
         
         # Populate By Label tree
+        label_items = []
         for label, entities in sorted(label_groups.items()):
-            label_item = QTreeWidgetItem(self.by_label_tree)
-            label_item.setText(0, f"{label} ({len(entities)})")
-            label_item.setFont(0, QFont("Arial", 10, QFont.Bold))
-            
-            for entity in sorted(entities, key=lambda x: (x['sentence_num'], x['start'])):
-                entity_item = QTreeWidgetItem(label_item)
-                entity_item.setText(0, "")
-                entity_item.setText(1, entity['text'])
-                entity_item.setText(2, str(entity['sentence_num']))
-                entity_item.setText(3, entity['context'])
-        
-        self.by_label_tree.expandAll()
-        
-        # Populate By Sentence tree
-        for sentence_num, entities in sorted(sentence_groups.items()):
-            sentence_item = QTreeWidgetItem(self.by_sentence_tree)
-            sentence_item.setText(0, f"Sentence {sentence_num} ({len(entities)} entities)")
-            sentence_item.setFont(0, QFont("Arial", 10, QFont.Bold))
-            
-            for entity in sorted(entities, key=lambda x: x['start']):
-                entity_item = QTreeWidgetItem(sentence_item)
-                entity_item.setText(0, "")
-                entity_item.setText(1, entity['text'])
-                entity_item.setText(2, entity['label'])
-                entity_item.setText(3, f"{entity['start']}-{entity['end']}")
-        
-        self.by_sentence_tree.expandAll()
-        
-        # Populate All Entities tree
-        for entity in sorted(all_entities, key=lambda x: (x['sentence_num'], x['start'])):
-            entity_item = QTreeWidgetItem(self.all_entities_tree)
-            entity_item.setText(0, entity['text'])
-            entity_item.setText(1, entity['label'])
-            entity_item.setText(2, str(entity['sentence_num']))
-            entity_item.setText(3, entity['context'])
-        
-        # Update statistics
-        total_entities = len(all_entities)
-        unique_entities = len(set(entity['text'].lower() for entity in all_entities))
-        total_labels = len(label_groups)
-        sentences_with_entities = len(sentence_groups)
+            label_item = self.make_group_item(f"{label} ({len(entities)})", label)
+            self._label_items[label] = label_item
+            self._label_order.append(label)
+            self._label_keys[label] = [(sentence_num, start) for _, sentence_num, start, _ in entities]
+            self._pending_label_rows[label] = [
+                ["", entity_text, str(sentence_num), context]
+                for entity_text, sentence_num, start, context in entities
+            ]
+            label_items.append(label_item)
+        
+        self.by_label_tree.addTopLevelItems(label_items)
         
+        self.update_stats()
+        
+        # Resize columns once every tree is filled, then let the trees repaint
+        for tree in [self.by_label_tree, self.by_sentence_tree, self.all_entities_tree]:
+            # One call sizes every column of the tree (same result as resizeColumnToContents on each column)
+            tree.header().resizeSections(QHeaderView.ResizeToContents)
+            tree.blockSignals(False)
+        self.set_trees_updates_enabled(True)
+    
+    def update_stats(self):
+        """Update the statistics label from the tree index"""
         stats_text = f"""
-        Total Entities: {total_entities}
-        Unique Entities: {unique_entities}
-        Labels Used: {total_labels}
-        Sentences with Entities: {sentences_with_entities}
+        Total Entities: {len(self._tree_entities)}
+        Unique Entities: {len(self._text_counts)}
+        Labels Used: {len(self._label_items)}
+        Sentences with Entities: {len(self._sentence_items)}
         """.strip()
         
         self.stats_label.setText(stats_text)
-        
-        # Resize columns
+    
+    def set_trees_updates_enabled(self, enabled):
+        """Turn repainting of the three trees off while items are moved around, and back on afterwards"""
         for tree in [self.by_label_tree, self.by_sentence_tree, self.all_entities_tree]:
-            for i in range(tree.columnCount()):
-                tree.resizeColumnToContents(i)
+            tree.setUpdatesEnabled(enabled)
+    
+    @staticmethod
+    def insert_key(keys, key):
+        """Insert key into a sorted key list and return its position (which is also the tree row to insert at)"""
+        position = bisect.bisect_left(keys, key)
+        keys.insert(position, key)
+        return position
+    
+    @staticmethod
+    def remove_key(keys, key):
+        """Remove key from a sorted key list and return the position it was at"""
+        position = bisect.bisect_left(keys, key)
+        del keys[position]
+        return position
+    
+    def make_group_item(self, text, key):
+        """Create a label/sentence group row. key (the label or sentence number) is stored on the item so populate_group can find its pending rows"""
+        group_item = QTreeWidgetItem([text])
+        group_item.setFont(0, self._group_font)
+        group_item.setData(0, Qt.UserRole, key)
+        # Show the expand arrow even while the group has no child items yet
+        group_item.setChildIndicatorPolicy(QTreeWidgetItem.ShowIndicator)
+        return group_item
+    
+    def populate_group(self, group_item, pending_rows):
+        """Build the child items of a group the first time it is expanded"""
+        rows = pending_rows.pop(group_item.data(0, Qt.UserRole), None)
+        if rows is not None:
+            group_item.addChildren([QTreeWidgetItem(row) for row in rows])
+            group_item.treeWidget().header().resizeSections(QHeaderView.ResizeToContents)
+    
+    @staticmethod
+    def insert_group_row(group_item, pending_rows, key, position, row):
+        """Insert a row into a group, or into its pending rows if the group has never been expanded"""
+        rows = pending_rows.get(key)
+        if rows is not None:
+            rows.insert(position, row)
+        else:
+            group_item.insertChild(position, QTreeWidgetItem(row))
+    
+    @staticmethod
+    def remove_group_row(group_item, pending_rows, key, position):
+        """Remove a row from a group, or from its pending rows if the group has never been expanded"""
+        rows = pending_rows.get(key)
+        if rows is not None:
+            del rows[position]
+        else:
+            group_item.takeChild(position)
+    
+    def add_entity(self, sentence_idx, start, end, entity_text, label, sentence_text):
+        """Add a single entity to the three trees, only touching the rows it belongs to"""
+        sentence_num = sentence_idx + 1
+        context = self.get_context(sentence_text, start, end)
+        self.set_trees_updates_enabled(False)
+        
+        # By Label tree: create the label row if this is the first entity with that label
+        label_item = self._label_items.get(label)
+        if label_item is None:
+            label_item = self.make_group_item("", label)
+            self.by_label_tree.insertTopLevelItem(self.insert_key(self._label_order, label), label_item)
+            self._label_items[label] = label_item
+            self._label_keys[label] = []
+            # New groups start collapsed with their rows pending, the same as groups from a full rebuild
+            self._pending_label_rows[label] = []
+        self.insert_group_row(
+            label_item, self._pending_label_rows, label,
+            self.insert_key(self._label_keys[label], (sentence_num, start)),
+            ["", entity_text, str(sentence_num), context]
+        )
+        label_item.setText(0, f"{label} ({len(self._label_keys[label])})")
+        
+        # By Sentence tree: same idea with one row per sentence
+        sentence_item = self._sentence_items.get(sentence_num)
+        if sentence_item is None:
+            sentence_item = self.make_group_item("", sentence_num)
+            self.by_sentence_tree.insertTopLevelItem(self.insert_key(self._sentence_order, sentence_num), sentence_item)
+            self._sentence_items[sentence_num] = sentence_item
+            self._sentence_keys[sentence_num] = []
+            self._pending_sentence_rows[sentence_num] = []
+        self.insert_group_row(
+            sentence_item, self._pending_sentence_rows, sentence_num,
+            self.insert_key(self._sentence_keys[sentence_num], start),
+            ["", entity_text, label, f"{start}-{end}"]
+        )
+        sentence_item.setText(0, f"Sentence {sentence_num} ({len(self._sentence_keys[sentence_num])} entities)")
+        
+        # All Entities tree
+        self.all_entities_tree.insertTopLevelItem(
+            self.insert_key(self._all_keys, (sentence_num, start)),
+            QTreeWidgetItem([entity_text, label, str(sentence_num), context])
+        )
+        
+        self._tree_entities[(sentence_idx, start)] = (label, entity_text.lower())
+        self._text_counts[entity_text.lower()] += 1
+        
+        self.set_trees_updates_enabled(True)
+        self.update_stats()
+    
+    def remove_entity(self, sentence_idx, start):
+        """Remove a single entity from the three trees, dropping its label/sentence row if it was the last one there"""
+        entity = self._tree_entities.pop((sentence_idx, start), None)
+        if entity is None:
+            return
+        label, text_key = entity
+        sentence_num = sentence_idx + 1
+        self.set_trees_updates_enabled(False)
+        
+        # By Label tree
+        label_item = self._label_items[label]
+        self.remove_group_row(label_item, self._pending_label_rows, label, self.remove_key(self._label_keys[label], (sentence_num, start)))
+        if self._label_keys[label]:
+            label_item.setText(0, f"{label} ({len(self._label_keys[label])})")
+        else:
+            self.by_label_tree.takeTopLevelItem(self.remove_key(self._label_order, label))
+            del self._label_items[label]
+            del self._label_keys[label]
+            self._pending_label_rows.pop(label, None)
+        
+        # By Sentence tree
+        sentence_item = self._sentence_items[sentence_num]
+        self.remove_group_row(sentence_item, self._pending_sentence_rows, sentence_num, self.remove_key(self._sentence_keys[sentence_num], start))
+        if self._sentence_keys[sentence_num]:
+            sentence_item.setText(0, f"Sentence {sentence_num} ({len(self._sentence_keys[sentence_num])} entities)")
+        else:
+            self.by_sentence_tree.takeTopLevelItem(self.remove_key(self._sentence_order, sentence_num))
+            del self._sentence_items[sentence_num]
+            del self._sentence_keys[sentence_num]
+            self._pending_sentence_rows.pop(sentence_num, None)
+        
+        # All Entities tree
+        self.all_entities_tree.takeTopLevelItem(self.remove_key(self._all_keys, (sentence_num, start)))
+        
+        self._text_counts[text_key] -= 1
+        if not self._text_counts[text_key]:
+            del self._text_counts[text_key]
+        
+        self.set_trees_updates_enabled(True)
+        self.update_stats()
     
     def get_context(self, sentence, start, end, context_length=30):
         """Get context around the entity for display"""
@@ -815,22 +848,12 @@ class EntitySummaryWidget(QWidget):
         prefix = "..." if context_start > 0 else ""
         suffix = "..." if context_end < len(sentence) else ""
         
-        context = sentence[context_start:context_end]
-        # Highlight the entity within the context
-        entity_start_in_context = start - context_start
-        entity_end_in_context = end - context_start
-        
-        highlighted_context = (
-            context[:entity_start_in_context] + 
-            "[" + context[entity_start_in_context:entity_end_in_context] + "]" +
-            context[entity_end_in_context:]
-        )
-        
-        return prefix + highlighted_context + suffix
+        # Slice the sentence directly around the entity and build the string in one f-string, instead of slicing a context copy and joining with +
+        return f"{prefix}{sentence[context_start:start]}[{sentence[start:end]}]{sentence[end:context_end]}{suffix}"
     
     def export_entities(self):
         """Export entity list to CSV or text file"""
-        if self.parent_window and hasattr(self.parent_window, 'annotations'):
+        if self.parent_window and hasattr(self.parent_window, 'annotations_by_sentence'):
             file_path, _ = QFileDialog.getSaveFileName(
                 self, "Export Entity List", "entity_list.txt", 
                 "Text Files (*.txt);;CSV Files (*.csv);;All Files (*)"
@@ -838,37 +861,34 @@ class EntitySummaryWidget(QWidget):
             
             if file_path:
                 try:
-                    all_entities = []
-                    for sentence_idx, entities in self.parent_window.annotations.items():
-                        for start, end, entity_text, label in entities:
-                            all_entities.append({
-                                'entity': entity_text,
-                                'label': label,
-                                'sentence': sentence_idx + 1,
-                                'position': f"{start}-{end}"
-                            })
+                    # One (entity, label, sentence number, position) row per entity, which is exactly a CSV row
+                    rows = (
+                        (entity_text, label, sentence_idx + 1, f"{start}-{end}")
+                        for sentence_idx, entities in self.parent_window.annotations_by_sentence()
+                        for start, end, entity_text, label in entities
+                    )
                     
                     if file_path.endswith('.csv'):
                         import csv
-                        with open(file_path, 'w', newline='', encoding='utf-8') as f:
+                        with open(file_path, 'w', newline='', encoding='utf-8', buffering=1 << 20) as f:
                             writer = csv.writer(f)
                             writer.writerow(['Entity', 'Label', 'Sentence', 'Position'])
-                            for entity in all_entities:
-                                writer.writerow([entity['entity'], entity['label'], 
-                                               entity['sentence'], entity['position']])
+                            writer.writerows(rows)
                     else:
-                        with open(file_path, 'w', encoding='utf-8') as f:
-                            f.write("Entity List\n")
-                            f.write("=" * 50 + "\n\n")
+                        # Build the whole file as a list of strings and write it in one call
+                        parts = ["Entity List\n", "=" * 50 + "\n\n"]
+                        
+                        current_label = None
+                        for entity_text, label, sentence_num, _ in sorted(rows, key=itemgetter(1, 2)):
+                            if label != current_label:
+                                current_label = label
+                                parts.append(f"\n{current_label}:\n")
+                                parts.append("-" * len(current_label) + "\n")
                             
-                            current_label = None
-                            for entity in sorted(all_entities, key=lambda x: (x['label'], x['sentence'])):
-                                if entity['label'] != current_label:
-                                    current_label = entity['label']
-                                    f.write(f"\n{current_label}:\n")
-                                    f.write("-" * len(current_label) + "\n")
-                                
-                                f.write(f"  • {entity['entity']} (Sentence {entity['sentence']})\n")
+                            parts.append(f"  • {entity_text} (Sentence {sentence_num})\n")
+                        
+                        with open(file_path, 'w', encoding='utf-8') as f:
+                            f.write("".join(parts))
                     
                     QMessageBox.information(self, "Success", f"Entity list exported to {file_path}")
                     
@@ -876,13 +896,34 @@ class EntitySummaryWidget(QWidget):
                     QMessageBox.critical(self, "Error", f"Failed to export entities: {str(e)}")
 
 class NamedEntityAnnotationTool(QMainWindow):
+    # Number of sentence widgets created at a time. Creating one widget per sentence up front is slow for long stories, so widgets are added in batches while scrolling.
+    SENTENCE_WIDGET_BATCH = 50
+    # Milliseconds to wait after an edit before refreshing the status/count labels, so a burst of edits only refreshes them once
+    LABEL_UPDATE_DELAY = 50
+    
     def __init__(self):
         super().__init__()
         self.sentences = []
+        self.sentence_offsets = []  # Where each sentence starts in the loaded story
         self.currentSentenceIndex = 0
-        self.annotations = {}  # Will store {sentence_index: [(start, end, text, label), ...]}
+        # Annotations are stored as parallel arrays: position i of every array describes the same entity. Entity text is not stored; it is sliced from the sentence when needed.
+        self.annotations = self.empty_annotations()
+        self.label_ids = {}  # label -> small integer id stored in self.annotations["label_id"]
+        self.label_names = []  # label id -> label
+        self.label_formats = []  # label id -> highlight format, shared by every sentence widget
+        # Running counts for the annotation label, updated on every add/remove
+        self._total_entities = 0
+        self._sentences_with_entities = 0
         self.textWidgets = []
         self.entity_labels = ["Private", "Communal/Public", "Extraterrestrial/Figurative", "Natural", "Institutional"]  # Default labels
+        self._header_font = QFont("Arial", 12, QFont.Bold)  # Shared by every "Sentence N:" header
+        self.register_labels()
+        self._pending_status = None
+        
+        self._update_timer = QTimer(self)
+        self._update_timer.setSingleShot(True)
+        self._update_timer.setInterval(self.LABEL_UPDATE_DELAY)
+        self._update_timer.timeout.connect(self._do_update_annotation_counts)
         
         self.init_ui()
         
@@ -962,6 +1003,8 @@ class NamedEntityAnnotationTool(QMainWindow):
         self.scroll_layout = QVBoxLayout(scroll_widget)
         scroll_area.setWidget(scroll_widget)
         scroll_area.setWidgetResizable(True)
+        # Sentence widgets are created in batches as the user scrolls towards the bottom
+        scroll_area.verticalScrollBar().valueChanged.connect(self.on_sentence_scroll)
         layout.addWidget(scroll_area)
         
         # Current annotations display
@@ -1006,6 +1049,7 @@ class NamedEntityAnnotationTool(QMainWindow):
         dialog = EntityLabelManager(self.entity_labels, self)
         if dialog.exec_() == QDialog.Accepted:
             self.entity_labels = dialog.labels
+            self.register_labels()
             self.labels_display.setText(f"Current Labels: {', '.join(self.entity_labels)}")
     
     def load_sentences(self):
@@ -1019,25 +1063,34 @@ class NamedEntityAnnotationTool(QMainWindow):
             
         try:
             if file_path.endswith('.json'):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    if isinstance(data, list):
-                        self.sentences = data
-                    else:
-                        QMessageBox.warning(self, "Invalid Format", "JSON file must contain a list of sentences.")
-                        return
+                if orjson is not None:
+                    with open(file_path, 'rb') as f:
+                        data = orjson.loads(f.read())
+                else:
+                    with open(file_path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                if isinstance(data, list):
+                    self.sentences = data
+                    # There is no original story for a JSON list, so there are no offsets to record
+                    self.sentence_offsets = []
+                else:
+                    QMessageBox.warning(self, "Invalid Format", "JSON file must contain a list of sentences.")
+                    return
             else:
                 # This part cleans the stories into sentence segments
+                # Text mode turns Windows "\r\n" line endings into "\n", so they become one space below instead of two
+                # Strict UTF-8: a story in another encoding fails to load instead of getting U+FFFD characters in its sentences and annotations
                 with open(file_path, 'r', encoding='utf-8') as f:
                     content = f.read()
-                    
-                    # Clean new lines
-                    content = re.sub(r"\n", " ", content)
-
-                    # Sentence segmentation
-                    segmentedSentences = nltk.sent_tokenize(content)
-
-                    self.sentences = segmentedSentences
+                
+                # Clean new lines (one character becomes one character, so offsets still match the text as read)
+                content = content.translate(NEWLINES_TO_SPACES)
+                
+                # Sentence segmentation
+                self.sentences, self.sentence_offsets = segment_sentences(content)
+                
+                # Release the full story text before the interface is built
+                del content
                                 
             self.setupAnnotationInterface()
             self.status_label.setText(f"Loaded {len(self.sentences)} sentences")
@@ -1052,64 +1105,176 @@ class NamedEntityAnnotationTool(QMainWindow):
             self.scroll_layout.itemAt(i).widget().setParent(None)
         
         self.textWidgets = []
-        self.annotations = {}
+        self.annotations = self.empty_annotations()
+        
+        # Only create the first batch of text widgets; the rest are created on demand in on_sentence_scroll
+        self.create_sentence_widgets()
+        
+        # Setup progress bar
+        self.progress_bar.setMaximum(len(self.sentences))
+        self.progress_bar.setValue(0)
+        self.progress_bar.setVisible(True)
+        
+        self.update_entity_display()
+    
+    def create_sentence_widgets(self):
+        """Create text widgets for the next batch of sentences that don't have one yet"""
+        first = len(self.textWidgets)
+        last = min(first + self.SENTENCE_WIDGET_BATCH, len(self.sentences))
         
-        # Create text widgets for each sentence
-        for i, sentence in enumerate(self.sentences):
+        for i in range(first, last):
             # Sentence header
             header = QLabel(f"Sentence {i + 1}:")
-            header.setFont(QFont("Arial", 12, QFont.Bold))
+            header.setFont(self._header_font)
             header.setStyleSheet("margin-top: 15px; margin-bottom: 5px; color: #333;")
             self.scroll_layout.addWidget(header)
             
             # Clickable text widget
-            text_widget = ClickableTextEdit(sentence, i, self)
+            text_widget = ClickableTextEdit(self.sentences[i], i, self)
             self.textWidgets.append(text_widget)
             self.scroll_layout.addWidget(text_widget)
-            
-            # Initialize annotations for this sentence
-            self.annotations[i] = []
+    
+    def on_sentence_scroll(self, value):
+        """Create more sentence widgets once the user scrolls close to the bottom of the ones that exist"""
+        scroll_bar = self.sender()
+        if value >= scroll_bar.maximum() - scroll_bar.pageStep() and len(self.textWidgets) < len(self.sentences):
+            self.create_sentence_widgets()
+    
+    @staticmethod
+    def empty_annotations():
+        return {
+            "start": array('i'),
+            "end": array('i'),
+            "label_id": array('h'),
+            "sentence_idx": array('i')
+        }
+    
+    def get_label_id(self, label):
+        """Return the integer id of a label, registering the label if it is new"""
+        label_id = self.label_ids.get(label)
+        if label_id is None:
+            label_id = len(self.label_names)
+            self.label_ids[label] = label_id
+            self.label_names.append(label)
+            self.label_formats.append(ClickableTextEdit.make_label_format(label))
+        return label_id
+    
+    def register_labels(self):
+        """Give every current label an id up front. Ids are never reused, so removed labels keep theirs and existing entities stay valid"""
+        for label in self.entity_labels:
+            self.get_label_id(label)
+    
+    def annotations_by_sentence(self):
+        """Yield (sentence_index, [(start, end, text, label), ...]) for every sentence that has entities, in sentence order"""
+        starts = self.annotations["start"]
+        ends = self.annotations["end"]
+        label_ids = self.annotations["label_id"]
+        sentence_ids = self.annotations["sentence_idx"]
+        
+        for sentence_idx, entity_indices in groupby(range(len(starts)), key=sentence_ids.__getitem__):
+            sentence = self.sentences[sentence_idx]
+            yield sentence_idx, [
+                (starts[i], ends[i], sentence[starts[i]:ends[i]], self.label_names[label_ids[i]])
+                for i in entity_indices
+            ]
+    
+    def sentence_annotation_range(self, sentence_idx):
+        """(first, last) slice of the (sorted) annotation arrays that holds the entities of sentence sentence_idx"""
+        sentence_ids = self.annotations["sentence_idx"]
+        first = bisect.bisect_left(sentence_ids, sentence_idx)
+        last = bisect.bisect_right(sentence_ids, sentence_idx, first)
+        return first, last
+    
+    def on_entity_added(self, sentence_idx, start, end, label_id):
+        """Record a newly tagged entity and add it to the summary without rebuilding everything"""
+        first, last = self.sentence_annotation_range(sentence_idx)
+        position = bisect.bisect_left(self.annotations["start"], start, first, last)
+        
+        # Keep the counts up to date here so the labels never have to rescan the annotations
+        self._total_entities += 1
+        if first == last:
+            self._sentences_with_entities += 1
+        
+        self.annotations["start"].insert(position, start)
+        self.annotations["end"].insert(position, end)
+        self.annotations["label_id"].insert(position, label_id)
+        self.annotations["sentence_idx"].insert(position, sentence_idx)
+        
+        sentence = self.sentences[sentence_idx]
+        self.entity_summary.add_entity(sentence_idx, start, end, sentence[start:end], self.label_names[label_id], sentence)
+        self.update_annotation_counts()
+    
+    def on_entity_removed(self, sentence_idx, start, end):
+        """Forget a removed entity and take it out of the summary without rebuilding everything"""
+        first, last = self.sentence_annotation_range(sentence_idx)
+        position = bisect.bisect_left(self.annotations["start"], start, first, last)
         
-        # Setup progress bar
-        self.progress_bar.setMaximum(len(self.sentences))
-        self.progress_bar.setValue(0)
-        self.progress_bar.setVisible(True)
+        self._total_entities -= 1
+        if last - first == 1:
+            self._sentences_with_entities -= 1
         
-        self.update_entity_display()
-    
-    def update_entity_display(self):
-        """Update the display of current annotations"""
-        total_entities = 0
-        sentences_with_entities = 0
+        for column in self.annotations.values():
+            del column[position]
         
-        for i, text_widget in enumerate(self.textWidgets):
-            entities = []
-            for start, end, label in text_widget.selected_ranges:
-                entity_text = text_widget.sentence[start:end]
-                entities.append((start, end, entity_text, label))
-            
-            self.annotations[i] = entities
-            if entities:
-                sentences_with_entities += 1
-                total_entities += len(entities)
+        self.entity_summary.remove_entity(sentence_idx, start)
+        self.update_annotation_counts()
+    
+    def set_status(self, text):
+        """Show text in the status label on the next (debounced) label refresh"""
+        self._pending_status = text
+        self._update_timer.start()
+    
+    def update_annotation_counts(self):
+        """Schedule a refresh of the progress bar and the annotation count label. Restarting the timer folds a burst of calls into one refresh."""
+        self._update_timer.start()
+    
+    def _do_update_annotation_counts(self):
+        """Update the progress bar, the annotation count label and any pending status message"""
+        if self._pending_status is not None:
+            self.status_label.setText(self._pending_status)
+            self._pending_status = None
         
         # Update progress
-        self.progress_bar.setValue(sentences_with_entities)
+        self.progress_bar.setValue(self._sentences_with_entities)
         
         # Update annotations display
-        if total_entities == 0:
+        if self._total_entities == 0:
             self.annotations_label.setText("Current Annotations: None")
         else:
             self.annotations_label.setText(
-                f"Current Annotations: {total_entities} entities in {sentences_with_entities} sentences"
+                f"Current Annotations: {self._total_entities} entities in {self._sentences_with_entities} sentences"
             )
+    
+    def update_entity_display(self):
+        """Rebuild the annotations and the whole entity summary from the text widgets"""
+        annotations = self.empty_annotations()
+        starts = annotations["start"]
+        ends = annotations["end"]
+        label_ids = annotations["label_id"]
+        sentence_ids = annotations["sentence_idx"]
+        sentences_with_entities = 0
+        
+        # Sentences whose widgets have not been created yet have no annotations
+        for text_widget in self.textWidgets:
+            if text_widget.selected_ranges:
+                sentences_with_entities += 1
+            for start, end, label_id in text_widget.selected_ranges:
+                starts.append(start)
+                ends.append(end)
+                label_ids.append(label_id)
+                sentence_ids.append(text_widget.sentence_index)
+        
+        self.annotations = annotations
+        self._total_entities = len(starts)
+        self._sentences_with_entities = sentences_with_entities
+        self.update_annotation_counts()
         
         # Update entity summary widget
-        self.entity_summary.update_entity_display(self.annotations, self.sentences)
+        self.entity_summary.update_entity_display(self.annotations_by_sentence(), self.sentences)
     
     def save_annotations(self):
         """Save annotations to JSON file"""
-        if not self.annotations:
+        if not self.sentences:
             QMessageBox.warning(self, "No Annotations", "No annotations to save.")
             return
         
@@ -1122,27 +1287,35 @@ class NamedEntityAnnotationTool(QMainWindow):
         
         try:
             # Prepare data for export
+            # Each sentence is written once, in "sentences"; entities only refer to it by index (their annotations key) and character positions
             export_data = {
                 "sentences": self.sentences,
                 "labels": self.entity_labels,
                 "annotations": {}
             }
+            # Only a TXT story gives real positions of the sentences in the original text
+            if self.sentence_offsets:
+                export_data["sentence_offsets"] = self.sentence_offsets
             
-            for sentence_idx, entities in self.annotations.items():
-                if entities:  # Only include sentences with annotations
-                    export_data["annotations"][str(sentence_idx)] = [
-                        {
-                            "start": start,
-                            "end": end,
-                            "text": text,
-                            "label": label,
-                            "sentence": self.sentences[sentence_idx]
-                        }
-                        for start, end, text, label in entities
-                    ]
+            # Only sentences with annotations are included
+            for sentence_idx, entities in self.annotations_by_sentence():
+                export_data["annotations"][sentence_idx] = [
+                    {
+                        "start": start,
+                        "end": end,
+                        "text": text,
+                        "label": label
+                    }
+                    for start, end, text, label in entities
+                ]
             
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(export_data, f, indent=2, ensure_ascii=False)
+            if orjson is not None:
+                # Both orjson (with OPT_NON_STR_KEYS) and json write the integer sentence indices as "0", "1", ... keys
+                with open(file_path, 'wb') as f:
+                    f.write(orjson.dumps(export_data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+            else:
+                with open(file_path, 'w', encoding='utf-8') as f:
+                    json.dump(export_data, f, indent=2, ensure_ascii=False)
             
             QMessageBox.information(self, "Success", f"Annotations saved to {file_path}")
             
@@ -1159,8 +1332,7 @@ class NamedEntityAnnotationTool(QMainWindow):
         
         if reply == QMessageBox.Yes:
             for text_widget in self.textWidgets:
-                text_widget.selected_ranges = []
-                text_widget.highlight_selections()
+                text_widget.clear_selections()
             
             self.update_entity_display()
             self.status_label.setText("All annotations cleared")
@@ -12,29 +12,93 @@ If you do not have NLTK, run:
 pip install nltk
 
 in your terminal.
-'''
-
-import json, nltk
 
-def buildTestData(txtStoryPathList, jsonTestingDataOutputPath):
+Optionally, run:
 
-    allSentences = []
+pip install blingfire
+pip install pysbd
+pip install orjson
 
-    #Iterating through the list of TXT story content
-    for txtStoryPath in txtStoryPathList:
-        with open(txtStoryPath, "r") as storyContent:
-            storyString = storyContent.read()
+Stories are split into sentences the same way as in softNERTagging.py: with blingfire if it is installed, otherwise pysbd, otherwise NLTK's punkt splitter. Install the same sentence splitting packages you used for tagging so that the testing sentences are split like the tagged ones. orjson writes the JSON file faster. Without orjson, the program uses Python's built-in json library.
+'''
 
-        storyString = storyString.replace("\n", " ")
-        
-        sentTokenized = nltk.sent_tokenize(storyString)
-        allSentences = allSentences + sentTokenized
+import json, nltk
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Translation table that turns line breaks and tabs into spaces in a single pass (the same cleaning softNERTagging.py does)
+newlinesToSpaces = str.maketrans("\n\r\t", "   ")
+
+def loadSentenceTokenizer():
+    """Load NLTK's English punkt sentence tokenizer (the one nltk.sent_tokenize uses) so it can be reused for every story."""
+    try:
+        # NLTK 3.8.2 and newer
+        return nltk.tokenize.PunktTokenizer("english")
+    except AttributeError:
+        return nltk.data.load("tokenizers/punkt/english.pickle")
+
+def loadSentenceSplitter():
+    """Return a function that splits a story into sentences. The order (blingfire, pysbd, then punkt) matches softNERTagging.get_sentence_splitter, keep the two in sync."""
+    try:
+        from blingfire import text_to_sentences
+
+        def blingfireSplitter(storyString):
+            # blingfire puts one sentence per line. The story has no line breaks of its own (they were turned into spaces when reading it)
+            return text_to_sentences(storyString).split("\n")
+
+        return blingfireSplitter
+    except ImportError:
+        pass
+    try:
+        import pysbd
+        return pysbd.Segmenter(language="en", clean=False).segment
+    except ImportError:
+        return loadSentenceTokenizer().tokenize
+
+# The sentence splitter of this process. It is loaded the first time tokenizeStory runs, so every worker process loads it once
+sentenceSplitter = None
+
+def tokenizeStory(txtStoryPath):
+    """Read one TXT story and split it into a list of sentences."""
+    global sentenceSplitter
+    if sentenceSplitter is None:
+        sentenceSplitter = loadSentenceSplitter()
+
+    # Clean the text as it is read, so the uncleaned copy of the story is freed right away
+    with open(txtStoryPath, "r", encoding="utf-8") as storyContent:
+        storyString = storyContent.read().translate(newlinesToSpaces)
+
+    # Same clean up as softNERTagging.segment_sentences: no surrounding spaces and no empty sentences
+    return [sentence.strip() for sentence in sentenceSplitter(storyString) if sentence.strip()]
+
+def buildTestData(txtStoryPathList, jsonTestingDataOutputPath, maxWorkers=None):
+    """maxWorkers (int or None): how many stories are tokenized at the same time. None uses one process per CPU core."""
+
+    if len(txtStoryPathList) > 1:
+        # Stories are independent, so they are tokenized in parallel worker processes. map gives the results back in the order of txtStoryPathList
+        with ProcessPoolExecutor(max_workers=maxWorkers) as executor:
+            sentencesPerStory = list(executor.map(tokenizeStory, txtStoryPathList))
+    else:
+        # Not worth starting worker processes for a single story
+        sentencesPerStory = [tokenizeStory(txtStoryPath) for txtStoryPath in txtStoryPathList]
+
+    allSentences = list(chain.from_iterable(sentencesPerStory))
 
     # Turning into a dictionary for JSON dump.
     trainingDict = {i: sentence for i, sentence in enumerate(allSentences)}
 
-    with open(jsonTestingDataOutputPath, "w") as trainingStorage:
-        json.dump(trainingDict, trainingStorage, indent=4)
+    if orjson is not None:
+        # Both paths indent by 2 spaces (the only indent orjson supports). OPT_NON_STR_KEYS writes the integer keys as "0", "1", ... like json does
+        with open(jsonTestingDataOutputPath, "wb") as trainingStorage:
+            trainingStorage.write(orjson.dumps(trainingDict, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    else:
+        with open(jsonTestingDataOutputPath, "w", encoding="utf-8") as trainingStorage:
+            json.dump(trainingDict, trainingStorage, indent=2, ensure_ascii=False)
     
     print(f"Finished creating testing data at {jsonTestingDataOutputPath}")
 
@@ -15,11 +15,40 @@ Negative: hard NER
 Negative: general words
 Positive: soft NER
 
+Optionally, run:
+
+pip install orjson
+
+orjson writes the combined JSON file faster. Without orjson, the program uses Python's built-in json library.
 '''
 import json
-from dataclasses import dataclass, asdict
+import os
+import re
+import sys
+import warnings
+from array import array
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
+from dataclasses import dataclass
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# A token is a run of non-whitespace characters (\s matches exactly the characters str.isspace() treats as whitespace)
+tokenPattern = re.compile(r'\S+')
 
-@dataclass
+def loadNerJson(path):
+    """Read one hard or soft NER JSON file."""
+    if orjson is not None:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+@dataclass(slots=True)
 class TokenAnnotation:
     """Represents annotation for a single token."""
     token: str
@@ -29,7 +58,7 @@ class TokenAnnotation:
     sentenceId: int
 
 
-@dataclass
+@dataclass(slots=True)
 class CombinedAnnotation:
     """Represents combined annotations for a sentence."""
     sentenceId: int
@@ -55,102 +84,131 @@ class NerDatasetCombiner:
         if isinstance(softNerPaths, str):
             softNerPaths = [softNerPaths]
         
-        self.hardNerData = []
-        self.softNerData = []
-        
-        # Load all hard NER files
-        for path in hardNerPaths:
-            with open(path, 'r', encoding='utf-8') as f:
-                self.hardNerData.append(json.load(f))
-        
-        #Load all soft NER files
-        for path in softNerPaths:
-            with open(path, 'r', encoding='utf-8') as f:
-                self.softNerData.append(json.load(f))
+        # Load all hard and soft NER files, reading several files at once. map keeps the files in the order they were given
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            self.hardNerData = list(executor.map(loadNerJson, hardNerPaths))
+            self.softNerData = list(executor.map(loadNerJson, softNerPaths))
         
         # Use sentences from the first hard NER file as the base (assuming all files annotate the same sentences)
         self.sentences = self.hardNerData[0]['sentences']
         
-    def _tokenizeSentence(self, sentence):
-        """Simple tokenization that splits on whitespace and tracks character positions."""
-        tokens = []
-        start = 0
-        
-        for i, char in enumerate(sentence):
-            if char.isspace():
-                if start < i:
-                    tokens.append((sentence[start:i], start, i))
-                start = i + 1
+        # Sentence id string -> [(start, end, "Hard-X" / "Soft-X"), ...] from every file. Hard NER files come first and files keep their order, so when annotations overlap a token, the one earliest in this list gives the token its label
+        self._sentenceSpans = {}
+        for labelPrefix, nerPathList, nerDataList in (("Hard", hardNerPaths, self.hardNerData), ("Soft", softNerPaths, self.softNerData)):
+            # Raw label -> "Hard-X" / "Soft-X", so every token with the same label shares one string instead of a copy per annotation
+            labelNames = {}
+            for path, nerData in zip(nerPathList, nerDataList):
+                mismatchedAnnotations = 0
+                for sentenceIdStr, annotations in nerData['annotations'].items():
+                    for annotation in annotations:
+                        # Hard NER entities store their sentence's position in "sentence_index". Prefer it over the key, since older hard NER files numbered their keys by counting only the sentences that had entities
+                        sentenceIndex = annotation.get('sentence_index')
+                        if sentenceIndex is not None:
+                            sentenceIdStr = str(sentenceIndex)
+                        
+                        # An annotation whose text is not found at its position in the sentence is attached to the wrong sentence
+                        if 'text' in annotation and not self._annotationMatchesSentence(sentenceIdStr, annotation):
+                            mismatchedAnnotations += 1
+                        
+                        rawLabel = annotation['label']
+                        labelName = labelNames.get(rawLabel)
+                        if labelName is None:
+                            labelName = labelNames[rawLabel] = sys.intern(f"{labelPrefix}-{rawLabel}")
+                        self._sentenceSpans.setdefault(sentenceIdStr, []).append((annotation['start'], annotation['end'], labelName))
+                
+                if mismatchedAnnotations:
+                    warnings.warn(f"{mismatchedAnnotations} annotations in {path} do not match the text of the sentence they point to, so their labels will land on the wrong words. Check that this file was made from the same story as {hardNerPaths[0]}.")
         
-        if start < len(sentence):
-            tokens.append((sentence[start:], start, len(sentence)))
+        # Result of combineAnnotations, kept so that toBioFormat, toDict and getStatistics don't redo the tokenizing and label matching
+        self._combinedCache = None
+        # (totalTokens, labelCounts) counted while combineAnnotations builds the cache, so getStatistics does not walk every token again
+        self._combinedStats = None
         
-        return tokens
+    def _annotationMatchesSentence(self, sentenceIdStr, annotation):
+        """Check that an annotation's text is what its sentence has between the annotation's start and end."""
+        try:
+            sentence = self.sentences[int(sentenceIdStr)]
+        except (ValueError, IndexError):
+            return False
+        return sentence[annotation['start']:annotation['end']] == annotation['text']
     
-    def _getLabelForSpan(self, sentenceId, charStart, charEnd):
-        """Get the label for a character span, checking all hard and soft NER files."""
-        sentenceIdStr = str(sentenceId)
+    def _tokenizeSentence(self, sentence):
+        """Simple tokenization that splits on whitespace and tracks character positions. Returns parallel lists of tokens and their (start, end) character spans."""
+        matches = list(tokenPattern.finditer(sentence))
+        return [match.group() for match in matches], [match.span() for match in matches]
+    
+    def _rankCharacters(self, sentenceLength, spans):
+        """For every character of a sentence, find the first annotation in spans that covers it.
         
-        # Check all hard NER files
-        for idx, hardNer in enumerate(self.hardNerData):
-            if sentenceIdStr in hardNer['annotations']:
-                for annotation in hardNer['annotations'][sentenceIdStr]:
-                    annStart = annotation['start']
-                    annEnd = annotation['end']
-                    
-                    if charStart < annEnd and charEnd > annStart:
-                        return f"Hard-{annotation['label']}"
+        Returns an array where position i holds the index in spans of that annotation, or len(spans) if no annotation covers character i.
+        """
+        charRanks = array('L', [len(spans)]) * sentenceLength
         
-        # Check all soft NER files
-        for idx, softNer in enumerate(self.softNerData):
-            if sentenceIdStr in softNer['annotations']:
-                for annotation in softNer['annotations'][sentenceIdStr]:
-                    annStart = annotation['start']
-                    annEnd = annotation['end']
-                    
-                    if charStart < annEnd and charEnd > annStart:
-                        return f"Soft-{annotation['label']}"
+        # Annotations are written from last to first, so where annotations overlap, the earlier one (which wins) is written last
+        for rank in range(len(spans) - 1, -1, -1):
+            annStart, annEnd, _ = spans[rank]
+            annStart = max(annStart, 0)
+            annEnd = min(annEnd, sentenceLength)
+            if annStart < annEnd:
+                charRanks[annStart:annEnd] = array('L', [rank]) * (annEnd - annStart)
         
-        return "O"
+        return charRanks
     
-    def combineAnnotations(self):
-        """Combine hard and soft NER annotations for all sentences."""
-        combinedData = []
-        
+    def _iterCombinedAnnotations(self):
+        """Yield the CombinedAnnotation of each sentence, one at a time, without keeping them."""
         for sentId, sentence in enumerate(self.sentences):
-            tokensData = self._tokenizeSentence(sentence)
+            # charSpans is already in the (start, end) shape that is saved, so it is used as is for labeling and output
+            tokens, charSpans = self._tokenizeSentence(sentence)
+            spans = self._sentenceSpans.get(str(sentId))
             
-            tokens = []
-            labels = []
-            charSpans = []
-            
-            for token, startChar, endChar in tokensData:
-                label = self._getLabelForSpan(sentId, startChar, endChar)
-                
-                tokens.append(token)
-                labels.append(label)
-                charSpans.append((startChar, endChar))
+            if spans:
+                # Label every character once, then a token's label comes from the best-ranked annotation over its characters
+                charRanks = self._rankCharacters(len(sentence), spans)
+                # Label of each rank, where rank len(spans) means no annotation
+                rankLabels = [label for _, _, label in spans]
+                rankLabels.append("O")
+                labels = [rankLabels[min(charRanks[startChar:endChar])] for startChar, endChar in charSpans]
+            else:
+                # No annotations in this sentence, so every token is a general word
+                labels = ["O"] * len(tokens)
             
-            # Create annotation
-            combinedAnnotation = CombinedAnnotation(
+            yield CombinedAnnotation(
                 sentenceId=sentId,
                 sentence=sentence,
                 tokens=tokens,
                 labels=labels,
                 charSpans=charSpans
             )
-            
+    
+    def combineAnnotations(self):
+        """Combine hard and soft NER annotations for all sentences. The result is computed once and reused by every later call."""
+        if self._combinedCache is not None:
+            return self._combinedCache
+        
+        combinedData = []
+        totalTokens = 0
+        labelCounts = Counter()
+        
+        # The counts for getStatistics are taken in the same pass that builds the list
+        for combinedAnnotation in self._iterCombinedAnnotations():
             combinedData.append(combinedAnnotation)
+            totalTokens += len(combinedAnnotation.tokens)
+            labelCounts.update(combinedAnnotation.labels)
         
+        self._combinedCache = combinedData
+        self._combinedStats = (totalTokens, labelCounts)
         return combinedData
     
     # Only use this if the function call in the Main function block chooses to use BIO format
     def toBioFormat(self):
         """Convert annotations to BIO tagging format."""
-        combined = self.combineAnnotations()
-        bioData = []
-        
-        for annotation in combined:
+        return list(self._iterBioSentences())
+    
+    def _iterBioSentences(self, annotations=None):
+        """Yield the BIO format dictionary of each sentence, one at a time. Uses combineAnnotations unless annotations are given."""
+        if annotations is None:
+            annotations = self.combineAnnotations()
+        for annotation in annotations:
             tokensBio = []
             prevLabel = "O"
             
@@ -168,62 +226,101 @@ class NerDatasetCombiner:
                 })
                 prevLabel = label
             
-            bioData.append({
+            yield {
                 "sentenceId": annotation.sentenceId,
                 "sentence": annotation.sentence,
                 "tokens": tokensBio
-            })
-        
-        return bioData
+            }
     
-    def toDict(self):
-        """Convert combined annotations to dictionary format."""
-        combined = self.combineAnnotations()
-        
-        # Collect all labels from all files
-        allHardLabels = []
+    def _sentenceDict(self, annotation):
+        """Convert one CombinedAnnotation to the dictionary written in the standard format."""
+        # Plain dict instead of dataclasses.asdict, which deep copies every token list
+        return {"sentenceId": annotation.sentenceId, "sentence": annotation.sentence, "tokens": annotation.tokens, "labels": annotation.labels, "charSpans": annotation.charSpans}
+    
+    def _metadata(self):
+        """Label types and file counts that go with the standard format."""
+        # Collect the distinct labels from all files
+        allHardLabels = set()
         for hardNer in self.hardNerData:
-            allHardLabels.extend(hardNer.get('labels', []))
+            allHardLabels.update(hardNer.get('labels', []))
         
-        allSoftLabels = []
+        allSoftLabels = set()
         for softNer in self.softNerData:
-            allSoftLabels.extend(softNer.get('labels', []))
+            allSoftLabels.update(softNer.get('labels', []))
         
         return {
-            "sentences": [asdict(ann) for ann in combined],
             "labelTypes": ["O", "Hard NER", "Soft NER"],
-            "hardLabels": list(set(allHardLabels)),
-            "softLabels": list(set(allSoftLabels)),
+            "hardLabels": sorted(allHardLabels),
+            "softLabels": sorted(allSoftLabels),
             "numHardNerFiles": len(self.hardNerData),
             "numSoftNerFiles": len(self.softNerData)
         }
     
-    def saveCombined(self, outputPath, format="standard"):
-        """Save combined annotations to a JSON file."""
+    def toDict(self):
+        """Convert combined annotations to dictionary format."""
+        combined = self.combineAnnotations()
+        
+        return {
+            "sentences": [self._sentenceDict(annotation) for annotation in combined],
+            **self._metadata()
+        }
+    
+    def _writeJson(self, data, outputPath, pretty=False):
+        """Write data to a JSON file, indented only if pretty is True."""
+        if orjson is not None:
+            # orjson writes UTF-8 without escaping non-ASCII characters, same as ensure_ascii=False
+            option = orjson.OPT_NON_STR_KEYS
+            if pretty:
+                option |= orjson.OPT_INDENT_2
+            with open(outputPath, 'wb') as f:
+                f.write(orjson.dumps(data, option=option))
+        else:
+            with open(outputPath, 'w', encoding='utf-8') as f:
+                if pretty:
+                    json.dump(data, f, indent=2, ensure_ascii=False)
+                else:
+                    json.dump(data, f, separators=(",", ":"), ensure_ascii=False)
+    
+    def saveCombined(self, outputPath, format="standard", pretty=False):
+        """Save combined annotations to a JSON file. Set pretty=True to indent the JSON so it is easier to read by eye (the file gets much bigger and slower to write)."""
         if format == "bio":
             data = self.toBioFormat()
         else:
             data = self.toDict()
         
-        with open(outputPath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        self._writeJson(data, outputPath, pretty)
+    
+    def saveCombinedJsonl(self, outputPath, format="standard"):
+        """Save combined annotations as JSONL, one sentence per line, so the file can be read (or appended to) one sentence at a time.
+        
+        For the standard format, the label types and file counts that toDict would add go to a separate "<name>_meta.json" file next to outputPath.
+        """
+        # Reuse the combined annotations if they were already built. Otherwise each sentence is combined right before its line is written, so the whole dataset is never held in memory
+        annotations = self._combinedCache if self._combinedCache is not None else self._iterCombinedAnnotations()
+        
+        if format == "bio":
+            sentences = self._iterBioSentences(annotations)
+        else:
+            sentences = (self._sentenceDict(annotation) for annotation in annotations)
+            self._writeJson(self._metadata(), os.path.splitext(outputPath)[0] + "_meta.json", pretty=True)
+        
+        with open(outputPath, 'wb') as f:
+            for sentence in sentences:
+                if orjson is not None:
+                    f.write(orjson.dumps(sentence))
+                else:
+                    f.write(json.dumps(sentence, separators=(",", ":"), ensure_ascii=False).encode('utf-8'))
+                f.write(b"\n")
     
     def getStatistics(self):
         """Get statistics about the combined dataset."""
         combined = self.combineAnnotations()
-        
-        totalTokens = 0
-        labelCounts = {}
-        
-        for annotation in combined:
-            totalTokens += len(annotation.tokens)
-            for label in annotation.labels:
-                labelCounts[label] = labelCounts.get(label, 0) + 1
+        totalTokens, labelCounts = self._combinedStats
         
         return {
             "totalSentences": len(combined),
             "totalTokens": totalTokens,
-            "labelDistribution": labelCounts,
+            "labelDistribution": dict(labelCounts),
             "avgTokensPerSentence": totalTokens / len(combined) if combined else 0,
             "numHardNerFiles": len(self.hardNerData),
             "numSoftNerFiles": len(self.softNerData)
@@ -264,6 +361,10 @@ if __name__ == "__main__":
     # combiner.saveCombined("trainingCombinedNERBioFormat.json", format="bio") #note that this function call returns the BIO data tagging format.
     # print("Saved: trainingCombinedNERBioFormat.json")
     
+    # TODO: This function call writes the same standard format data as JSONL (one sentence per line) instead, which training libraries can stream without loading the whole file. The label types and file counts are saved next to it in "<name>_meta.json". Use it in place of the saveCombined call above if your training code reads JSONL, so the data is not written twice.
+    # combiner.saveCombinedJsonl("training.jsonl", format="standard")
+    # print("Saved: training.jsonl")
+    
 
     # Get statistics that will be printed in your consol
     stats = combiner.getStatistics()
@@ -274,6 +375,6 @@ if __name__ == "__main__":
     print(f"  Total tokens: {stats['totalTokens']}")
     print(f"  Avg tokens/sentence: {stats['avgTokensPerSentence']:.2f}")
     print(f"\nLabel Distribution:")
-    for label, count in sorted(stats['labelDistribution'].items(), key=lambda x: x[1], reverse=True):
+    for label, count in sorted(stats['labelDistribution'].items(), key=itemgetter(1), reverse=True):
         percentage = (count / stats['totalTokens']) * 100
         print(f"  {label:30} {count:6} ({percentage:5.2f}%)")
\ No newline at end of file